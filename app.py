@@ -4,7 +4,8 @@ from datetime import date
 import pandas as pd
 import streamlit as st
 from openpyxl import load_workbook
-import requests
+
+from core import fetch_file_bytes, load_cached_frame
 
 # ─────────────────────────────────────────────
 # CONSTANTES
@@ -18,21 +19,24 @@ GREEN_RGB = "FF00FF00"   # única cor verde presente na planilha
 GITHUB_URL = "https://github.com/Djalmandre/Inventario26/raw/refs/heads/main/CRONOGRAMA%202026%20RECAP.xlsm"
 
 
-def fetch_file_bytes(url: str) -> bytes:
-    headers = {"User-Agent": "streamlit-app"}
-    resp = requests.get(url, headers=headers, timeout=90)
-    resp.raise_for_status()
-    return resp.content
+@st.cache_data(show_spinner=False)
+def load_data(file_digest: str, _file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
+    """
+    Devolve o DataFrame processado da planilha (cache em memória + parquet).
+    A chave é o file_digest; _file_bytes não é hasheado.
+    """
+    return load_cached_frame("inventario", file_digest, _file_bytes, sheet_name, parse_workbook)
 
 
-@st.cache_data(show_spinner=False)
-def load_data(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
+def parse_workbook(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
     """
     Lê a planilha em modo read_only (baixo consumo de memória).
     Conta posições ÚNICAS inventariadas — evita contar duplicatas
     quando a mesma posição está verde em mais de uma coluna.
     """
-    wb = load_workbook(io.BytesIO(file_bytes), data_only=True, read_only=True)
+    # Um único BytesIO/zip; keep_links=False não lê os vínculos externos do arquivo
+    wb = load_workbook(io.BytesIO(file_bytes), data_only=True, read_only=True,
+                       keep_links=False)
     ws = wb[sheet_name]
 
     col_data       = {}   # col_idx -> datetime
@@ -40,43 +44,41 @@ def load_data(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
     col_total      = {}   # col_idx -> int
     col_verde_vals = {}   # col_idx -> set de valores únicos verdes
 
-    for row in ws.iter_rows(min_row=1):
-        row_num = None
-        for cell in row:
-            if hasattr(cell, "row") and cell.row is not None:
-                row_num = cell.row
-                break
-        if row_num is None:
-            continue
-
+    # EmptyCell não tem .row/.column: linha e coluna vêm do enumerate,
+    # sem varrer cada linha à procura de uma célula "de verdade"
+    for row_num, row in enumerate(ws.iter_rows(min_row=1), start=1):
         if row_num == IDX_DATA_ROW:
-            for cell in row:
-                if hasattr(cell, "column") and cell.value is not None:
-                    col_data[cell.column] = cell.value
+            for c, cell in enumerate(row, start=1):
+                if cell.value is not None:
+                    col_data[c] = cell.value
 
         elif row_num == IDX_GROUP_ROW:
-            for cell in row:
-                if hasattr(cell, "column") and cell.value is not None:
-                    col_grupo[cell.column] = str(cell.value)
+            for c, cell in enumerate(row, start=1):
+                if cell.value is not None:
+                    col_grupo[c] = str(cell.value)
 
         elif row_num >= IDX_POS_START:
-            for cell in row:
-                if not hasattr(cell, "column"):
-                    continue
-                c = cell.column
+            for c, cell in enumerate(row, start=1):
                 if c not in col_data:
                     continue
-                if cell.value is None or str(cell.value).strip() == "":
+                v = cell.value
+                if v is None or (isinstance(v, str) and v.strip() == ""):
                     continue
 
                 col_total[c] = col_total.get(c, 0) + 1
 
                 try:
                     fill = cell.fill
-                    if (fill and fill.fill_type == "solid"
+                    if not (fill and fill.fill_type == "solid"
                             and fill.fgColor
-                            and fill.fgColor.type == "rgb"
-                            and str(fill.fgColor.rgb).upper() == GREEN_RGB):
+                            and fill.fgColor.type == "rgb"):
+                        continue
+                    # ARGB normalmente já vem em maiúsculas: isupper() (em C)
+                    # evita alocar uma cópia com upper() a cada célula
+                    rgb = fill.fgColor.rgb
+                    if isinstance(rgb, str) and not rgb.isupper():
+                        rgb = rgb.upper()
+                    if rgb == GREEN_RGB:
                         val = str(cell.value).strip().upper()
                         if c not in col_verde_vals:
                             col_verde_vals[c] = set()
@@ -90,7 +92,8 @@ def load_data(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
     # (mesmo que esteja verde em múltiplas colunas/dias)
     ja_inventariadas = set()
 
-    records = []
+    # Colunas em listas paralelas: o DataFrame sai direto delas, sem um dict por registro
+    cols, datas, grupos, totais, verdes = [], [], [], [], []
     for c in sorted(col_data.keys()):
         total = col_total.get(c, 0)
         if total == 0:
@@ -102,16 +105,22 @@ def load_data(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
 
         verde = len(novas)
 
-        records.append({
-            "col":          c,
-            "Data":         pd.to_datetime(col_data[c], errors="coerce"),
-            "Grupo":        col_grupo.get(c, ""),
-            "Total":        total,
-            "Inventariado": verde,
-            "Pendente":     total - verde,
-        })
-
-    df = pd.DataFrame(records).sort_values("Data").reset_index(drop=True)
+        cols.append(c)
+        datas.append(col_data[c])
+        grupos.append(col_grupo.get(c, ""))
+        totais.append(total)
+        verdes.append(verde)
+
+    df = pd.DataFrame({
+        "col":          cols,
+        # datetime do openpyxl passa direto; texto só no formato dd/mm/aaaa
+        "Data":         pd.to_datetime(pd.Series(datas, dtype=object),
+                                       format="%d/%m/%Y", errors="coerce"),
+        "Grupo":        grupos,
+        "Total":        totais,
+        "Inventariado": verdes,
+        "Pendente":     [t - v for t, v in zip(totais, verdes)],
+    }).sort_values("Data").reset_index(drop=True)
     return df
 
 
@@ -131,7 +140,7 @@ def main():
     # ── Download ──────────────────────────────────────────────────────────────
     with st.spinner("⬇️ Baixando planilha do GitHub..."):
         try:
-            file_bytes = fetch_file_bytes(GITHUB_URL)
+            file_digest, file_bytes = fetch_file_bytes(GITHUB_URL)
         except Exception as e:
             st.error(f"Erro ao baixar arquivo: {e}")
             st.stop()
@@ -139,7 +148,7 @@ def main():
     # ── Processamento ─────────────────────────────────────────────────────────
     with st.spinner("🔍 Lendo células e cores da planilha..."):
         try:
-            df = load_data(file_bytes, sheet_name)
+            df = load_data(file_digest, file_bytes, sheet_name)
         except Exception as e:
             st.error(f"Erro ao processar planilha: {e}")
             st.stop()
@@ -184,19 +193,21 @@ def main():
 
     # ── Tabela ────────────────────────────────────────────────────────────────
     st.subheader("📋 Detalhamento por Dia")
-    df_disp = df.copy()
-    df_disp["Data"] = df_disp["Data"].dt.strftime("%d/%m/%Y")
-    df_disp["% Concluído"] = df.apply(
-        lambda x: f"{round(x['Inventariado'] / x['Total'] * 100, 1)}%"
-        if x["Total"] > 0 else "0%",
-        axis=1,
-    )
-    df_disp["Meta Ideal"] = df.apply(
-        lambda x: ideal if x["Pendente"] > 0 else "✅", axis=1
-    )
+    pct = (df["Inventariado"] / df["Total"] * 100).round(1)
+    # Frame de exibição montado coluna a coluna, sem copiar o df inteiro
+    df_disp = pd.DataFrame({
+        "Data":         df["Data"].dt.strftime("%d/%m/%Y"),
+        "Grupo":        df["Grupo"],
+        "Total":        df["Total"],
+        "Inventariado": df["Inventariado"],
+        "Pendente":     df["Pendente"],
+        "% Concluído":  (pct.astype(str) + "%").where(df["Total"] > 0, "0%"),
+        "Meta Ideal":   pd.Series(ideal, index=df.index, dtype=object).where(
+            df["Pendente"] > 0, "✅"
+        ),
+    })
     st.dataframe(
-        df_disp[["Data", "Grupo", "Total", "Inventariado", "Pendente",
-                 "% Concluído", "Meta Ideal"]],
+        df_disp,
         use_container_width=True,
         hide_index=True,
     )
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+import requests
+import streamlit as st
+
+# ─────────────────────────────────────────────
+# FUNÇÕES COMPARTILHADAS (app.py e cronogramaupload.py)
+# ─────────────────────────────────────────────
+CACHE_VERSION = 2   # incrementar quando o DataFrame de algum load_data mudar
+CACHE_MAX_FILES = 8   # parquets mantidos por painel (os mais recentes)
+
+# Sessão única no módulo: reaproveita a conexão TCP/TLS entre os reruns
+# (keep-alive) e pede o arquivo comprimido; iter_content já descomprime
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "streamlit-app", "Accept-Encoding": "gzip"})
+
+
+def fetch_file_bytes(url: str) -> tuple[str, bytes]:
+    """
+    Baixa o arquivo e devolve (sha256, bytes).
+    A cópia fica na sessão junto com o ETag: nas execuções seguintes um
+    GET condicional (If-None-Match) recebe 304 e nada é baixado de novo.
+    """
+    headers = {}
+    cached = st.session_state.get("github_file")
+    if cached and cached["url"] == url and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+
+    # stream + blocos de 1 MB num bytearray: evita o join de resp.content
+    # (que dobra o pico de memória) e calcula o hash durante o download
+    with _SESSION.get(url, headers=headers, timeout=90, stream=True) as resp:
+        if resp.status_code == 304:
+            return cached["digest"], cached["bytes"]
+        resp.raise_for_status()
+
+        buf = bytearray()
+        sha = hashlib.sha256()
+        for chunk in resp.iter_content(chunk_size=1 << 20):
+            buf.extend(chunk)
+            sha.update(chunk)
+        etag = resp.headers.get("ETag")
+
+    file_bytes = bytes(buf)
+    digest = sha.hexdigest()
+    st.session_state["github_file"] = {
+        "url":    url,
+        "etag":   etag,
+        "digest": digest,
+        "bytes":  file_bytes,
+    }
+    return digest, file_bytes
+
+
+def parquet_cache_path(prefix: str, file_digest: str, sheet_name: str) -> Path:
+    """Caminho do cache em disco (parquet) do DataFrame já processado."""
+    key = hashlib.sha256(f"{CACHE_VERSION}:{file_digest}:{sheet_name}".encode()).hexdigest()
+    return Path(tempfile.gettempdir()) / f"{prefix}_{key[:32]}.parquet"
+
+
+def prune_parquet_cache(prefix: str, keep: int = CACHE_MAX_FILES) -> None:
+    """
+    Apaga os parquets mais antigos do painel, mantendo só os `keep` mais
+    recentes: cada upload novo gera um arquivo e o diretório não cresce sem limite.
+    """
+    paths = []
+    for path in Path(tempfile.gettempdir()).glob(f"{prefix}_*.parquet"):
+        try:
+            paths.append((path.stat().st_mtime, path))
+        except OSError:
+            pass   # removido por outro processo
+    paths.sort(reverse=True)
+    for _, path in paths[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def load_cached_frame(
+    prefix: str,
+    file_digest: str,
+    file_bytes: bytes,
+    sheet_name: str,
+    parse: Callable[[bytes, str], pd.DataFrame],
+) -> pd.DataFrame:
+    """
+    Devolve parse(file_bytes, sheet_name), gravando o resultado em parquet
+    no diretório temporário: depois de reiniciar o processo, o XLSX não
+    precisa ser reprocessado. prefix separa os caches de cada painel.
+    """
+    cache_path = parquet_cache_path(prefix, file_digest, sheet_name)
+    if cache_path.exists():
+        try:
+            df = pd.read_parquet(cache_path)
+        except Exception:
+            df = None   # arquivo corrompido/incompleto: reprocessa
+        if df is not None:
+            try:
+                os.utime(cache_path)   # mtime = último uso, para a limpeza
+            except OSError:
+                pass
+            return df
+
+    df = parse(file_bytes, sheet_name)
+    try:
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+        prune_parquet_cache(prefix)
+    except (OSError, ImportError):
+        pass   # cache em disco é opcional
+    return df
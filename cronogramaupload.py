@@ -1,14 +1,25 @@
+import hashlib
 import io
-from datetime import date
+from array import array
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-from openpyxl import load_workbook
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils import column_index_from_string
+from openpyxl.xml.constants import ARC_STYLE
+from openpyxl.xml.functions import fromstring
+
+from core import load_cached_frame
 
 # ─────────────────────────────────────────────
 # CONSTANTES DE ESTRUTURA DA PLANILHA
 # ─────────────────────────────────────────────
-IDX_QTDE      = 1   # pandas 0-based: linha "Qtde Posições"
+IDX_QTDE      = 1   # 0-based (linha Excel = idx + 1): linha "Qtde Posições"
 IDX_DIA       = 2   # linha "Dia da Semana"
 IDX_SEMANA    = 3   # linha "Semana"
 IDX_DATA      = 4   # linha "Data"
@@ -21,141 +32,316 @@ YELLOW_RGB = {"FFFFFF00", "FFFFC000", "FFFFFF99", "FFFFEB9C"}
 RED_RGB = {"FFFF0000", "FFC00000", "FFFF4444", "FFFF0000"}
 
 
-def safe_rgb(fg):
-    """Retorna o RGB da cor ou None sem lançar exceção."""
-    try:
-        if fg.type == "rgb":
-            return str(fg.rgb).upper()
-    except Exception:
-        pass
-    return None
+# ARGB -> status (consulta única em dicionário no laço quente)
+_RGB_STATUS = {
+    **{rgb: "INVENTARIADO" for rgb in GREEN_RGB},
+    **{rgb: "EM ANDAMENTO" for rgb in YELLOW_RGB},
+    **{rgb: "PROBLEMA" for rgb in RED_RGB},
+    "00000000": "PENDENTE",
+}
+
+# Cores de tema -> status; 9 (verde escuro) e 6 (verde claro) só contam com tint <= 0
+_THEME_STATUS = {9: "INVENTARIADO", 6: "INVENTARIADO", 7: "EM ANDAMENTO", 2: "PROBLEMA"}
+_THEME_SEM_TINT = {9, 6}
+
+# Códigos numéricos de status (índice na tupla)
+STATUS = ("PENDENTE", "INVENTARIADO", "EM ANDAMENTO", "PROBLEMA")
+STATUS_CODE = {status: code for code, status in enumerate(STATUS)}
+
+# Namespaces do SpreadsheetML
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL  = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG  = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_ROW = _NS_MAIN + "row"
+_C   = _NS_MAIN + "c"
+_V   = _NS_MAIN + "v"
+_T   = _NS_MAIN + "t"
+_R   = _NS_MAIN + "r"
+_IS  = _NS_MAIN + "is"
+
+
+def get_fill_status(fill):
+    """Classifica um preenchimento (PatternFill) por cor. Nunca lança exceção."""
+    if not fill or fill.fill_type != "solid":
+        return "PENDENTE"
+    fg = fill.fgColor
+    if fg is None:
+        return "PENDENTE"
 
+    if fg.type == "rgb":
+        # ARGB normalmente já vem em maiúsculas: isupper() (em C) evita a cópia
+        rgb = fg.rgb
+        if not isinstance(rgb, str):
+            return "PENDENTE"
+        if not rgb.isupper():
+            rgb = rgb.upper()
+        return _RGB_STATUS.get(rgb, "PENDENTE")
 
-def safe_theme(fg):
-    """Retorna (theme, tint) ou (None, None) sem lançar exceção."""
-    try:
-        if fg.type == "theme":
-            return fg.theme, (fg.tint or 0.0)
-    except Exception:
-        pass
-    return None, None
+    if fg.type == "theme":
+        status = _THEME_STATUS.get(fg.theme)
+        if status and (fg.theme not in _THEME_SEM_TINT or (fg.tint or 0.0) <= 0):
+            return status
+    return "PENDENTE"
 
 
-def get_cell_status(cell):
-    """Classifica a célula por cor. Nunca lança exceção."""
+# ─────────────────────────────────────────────
+# LEITURA DIRETA DO XLSX (zip + XML)
+# ─────────────────────────────────────────────
+
+def read_workbook_parts(z, sheet_name):
+    """Retorna (caminho do XML da aba, caminho do sharedStrings, origem dos seriais de data)."""
+    workbook = ET.fromstring(z.read("xl/workbook.xml"))
+    rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+
+    targets = {}
+    shared_strings = "xl/sharedStrings.xml"
+    for rel in rels.iter(_NS_PKG + "Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+        if rel.get("Type", "").endswith("/sharedStrings"):
+            shared_strings = target
+
+    for sheet in workbook.iter(_NS_MAIN + "sheet"):
+        if sheet.get("name") == sheet_name:
+            sheet_path = targets[sheet.get(_NS_REL + "id")]
+            break
+    else:
+        raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+    pr = workbook.find(_NS_MAIN + "workbookPr")
+    date1904 = pr is not None and pr.get("date1904", "").lower() in ("1", "true")
+    origin = "1904-01-01" if date1904 else "1899-12-30"
+    return sheet_path, shared_strings, origin
+
+
+def read_shared_strings(z, path):
+    """Lê a tabela de strings compartilhadas (texto puro, sem formatação)."""
     try:
-        fill = cell.fill
-        if not fill or fill.fill_type != "solid":
-            return "PENDENTE"
-        fg = fill.fgColor
-        if fg is None:
-            return "PENDENTE"
+        src = z.open(path)
+    except KeyError:
+        return []
+    strings = []
+    with src:
+        for _, node in ET.iterparse(src):
+            if node.tag == _NS_MAIN + "si":
+                strings.append(text_content(node))
+                node.clear()
+    return strings
+
+
+def read_style_status(z):
+    """Mapeia cada estilo de célula (atributo s) para o código de status da sua cor."""
+    try:
+        src = z.read(ARC_STYLE)
+    except KeyError:
+        return np.zeros(1, dtype=np.uint8)
+    stylesheet = Stylesheet.from_tree(fromstring(src))
+    if not stylesheet.cell_styles:
+        return np.zeros(1, dtype=np.uint8)
+
+    fills = stylesheet.fills
+    style_to_status = np.array(
+        [STATUS_CODE[get_fill_status(fills[xf.fillId])] for xf in stylesheet.cell_styles],
+        dtype=np.uint8,
+    )
+    return style_to_status
 
-        rgb = safe_rgb(fg)
-        if rgb:
-            if rgb == "00000000":
-                return "PENDENTE"
-            if rgb in GREEN_RGB:
-                return "INVENTARIADO"
-            if rgb in YELLOW_RGB:
-                return "EM ANDAMENTO"
-            if rgb in RED_RGB:
-                return "PROBLEMA"
-            return "PENDENTE"
 
-        theme, tint = safe_theme(fg)
-        if theme is not None:
-            if theme == 9 and tint <= 0:   # verde escuro
-                return "INVENTARIADO"
-            if theme == 6 and tint <= 0:   # verde claro
-                return "INVENTARIADO"
-            if theme == 7:
-                return "EM ANDAMENTO"
-            if theme == 2:
-                return "PROBLEMA"
-        return "PENDENTE"
-    except Exception:
-        return "PENDENTE"
+def text_content(node):
+    """Texto de um <si>/<is>: <t> direto + <t> de cada trecho <r>."""
+    text = node.findtext(_T) or ""
+    for run in node.iterfind(_R):
+        text += run.findtext(_T) or ""
+    return text
+
+
+def cell_value(c, strings):
+    """
+    Valor de uma célula <c> (data_only). Datas ficam como serial numérico:
+    a conversão é feita de uma vez em load_data, com unit="D"; só as
+    células t="d" (texto ISO 8601) já saem como datetime.
+    Erros (#N/A, #REF!...) valem None, como o NaN do pd.read_excel.
+    """
+    t = c.get("t", "n")
+    if t == "e":
+        return None
+    if t == "inlineStr":
+        node = c.find(_IS)
+        return text_content(node) if node is not None else None
+
+    v = c.findtext(_V) or None
+    if v is None:
+        return None
+    if t == "s":
+        return strings[int(v)]
+    if t == "n":
+        return float(v) if ("." in v or "E" in v or "e" in v) else int(v)
+    if t == "b":
+        return v == "1"
+    if t == "d":
+        try:
+            return datetime.fromisoformat(v).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return v   # "str"
 
 
-def count_green_cells(ws, col_idx, first_row, last_row):
-    """Conta células verdes/amarelas/vermelhas em uma coluna, linha a linha."""
-    inv = em_and = prob = 0
-    for r in range(first_row, last_row + 1):
-        status = get_cell_status(ws.cell(row=r, column=col_idx))
-        if status == "INVENTARIADO":
-            inv += 1
-        elif status == "EM ANDAMENTO":
-            em_and += 1
-        elif status == "PROBLEMA":
-            prob += 1
-    return inv, em_and, prob
+def count_status_by_col(cols, codes, n_cols):
+    """
+    Conta os status por coluna de uma vez: devolve uma matriz (n_cols x 4)
+    com np.bincount sobre col * 4 + código, em vez de somar célula a célula.
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    codes = np.asarray(codes, dtype=np.int64)
+    if cols.size:
+        n_cols = max(n_cols, int(cols.max()) + 1)
+    flat = np.bincount(cols * len(STATUS) + codes, minlength=n_cols * len(STATUS))
+    return flat.reshape(n_cols, len(STATUS))
 
 
 @st.cache_data(show_spinner=False)
-def load_data(file_bytes, sheet_name):
+def load_data(file_digest, _file_bytes, sheet_name):
     """
-    Carrega e processa a planilha.
-    Usa pandas para contar posições (rápido) e
-    openpyxl apenas para ler cores (somente colunas com posições).
+    Devolve o DataFrame processado da planilha (cache em memória + parquet).
+    A chave é o file_digest; _file_bytes não é hasheado.
     """
-    # ── 1. Pandas: estrutura e contagem de posições ──────────────────────────
-    df_raw = pd.read_excel(
-        io.BytesIO(file_bytes),
-        sheet_name=sheet_name,
-        header=None,
-        dtype=str,          # tudo como string para evitar conversões
-    )
+    return load_cached_frame("cronograma", file_digest, _file_bytes, sheet_name, parse_workbook)
 
-    row_dia   = df_raw.iloc[IDX_DIA]
-    row_data  = df_raw.iloc[IDX_DATA]
-    posicoes  = df_raw.iloc[IDX_POS_START:]   # linhas de posições
 
-    # Conta posições não-nulas por coluna (equivale ao CONT.VALORES)
-    total_por_col = posicoes.apply(
-        lambda col: col.dropna().apply(lambda v: str(v).strip() != "").sum()
+def parse_workbook(file_bytes, sheet_name):
+    """
+    Carrega e processa a planilha.
+    Lê o zip e o XML da aba direto, sem criar objetos de célula do openpyxl:
+    o styles.xml vira uma tabela (LUT) estilo -> status e cada <c> só
+    registra a coluna e o atributo s; a classificação é feita no fim, de
+    uma vez, com style_to_status[style_ids].
+    """
+    z = zipfile.ZipFile(io.BytesIO(file_bytes))
+    sheet_path, strings_path, origin = read_workbook_parts(z, sheet_name)
+    strings = read_shared_strings(z, strings_path)
+    blank_string = [not text.strip() for text in strings]
+    style_to_status = read_style_status(z)
+
+    row_dia  = {}   # col_idx (1-based) -> dia da semana
+    row_data = {}   # col_idx -> data
+    total    = {}   # col_idx -> posições não vazias (equivale ao CONT.VALORES)
+    cell_cols  = array("I")   # col_idx de cada célula da área de posições
+    cell_style = array("I")   # atributo s (id do estilo) da mesma célula
+    col_cache = {}  # letras da coluna -> col_idx
+    n_cells   = 0   # células até a última linha com algum valor
+
+    row_num = 0
+    with z.open(sheet_path) as src:
+        for _, row in ET.iterparse(src):
+            if row.tag != _ROW:
+                continue
+            r = row.get("r")
+            row_num = int(r) if r else row_num + 1
+
+            if row_num == IDX_DIA + 1 or row_num == IDX_DATA + 1:
+                dest = row_dia if row_num == IDX_DIA + 1 else row_data
+                col_idx = 0
+                for c in row.iterfind(_C):
+                    ref = c.get("r")
+                    col_idx = column_index_from_string(ref.rstrip("0123456789")) if ref else col_idx + 1
+                    value = cell_value(c, strings)
+                    if value is not None:
+                        dest[col_idx] = value
+
+            elif row_num >= IDX_POS_START + 1:
+                col_idx = 0
+                row_filled = False
+                for c in row.iterfind(_C):
+                    ref = c.get("r")
+                    if ref:
+                        letters = ref.rstrip("0123456789")
+                        col_idx = col_cache.get(letters)
+                        if col_idx is None:
+                            col_idx = col_cache[letters] = column_index_from_string(letters)
+                    else:
+                        col_idx += 1
+
+                    # Só strings podem ser "em branco"; números/datas contam direto
+                    # e erros (#N/A...) nunca contam
+                    t = c.get("t")
+                    if t == "e":
+                        filled = False
+                    elif t == "inlineStr":
+                        node = c.find(_IS)
+                        filled = node is not None and text_content(node).strip() != ""
+                    else:
+                        v = c.findtext(_V)
+                        if t == "s":
+                            filled = bool(v) and not blank_string[int(v)]
+                        elif t == "str":
+                            filled = bool(v) and v.strip() != ""
+                        else:
+                            filled = bool(v)
+                    if filled:
+                        total[col_idx] = total.get(col_idx, 0) + 1
+                        row_filled = True
+
+                    cell_cols.append(col_idx)
+                    cell_style.append(int(c.get("s", 0)))
+
+                if row_filled:
+                    n_cells = len(cell_cols)
+
+            row.clear()
+
+    z.close()
+
+    # Linhas só formatadas (sem valor) abaixo dos dados não entram na contagem
+    # de cores, como no intervalo que o pandas lia (até a última linha com valor)
+    del cell_cols[n_cells:]
+    del cell_style[n_cells:]
+
+    # counts[col_idx] -> [pendente, inventariado, em andamento, problema]
+    status_codes = style_to_status[np.frombuffer(cell_style, dtype=np.uint32)]
+    counts = count_status_by_col(
+        np.frombuffer(cell_cols, dtype=np.uint32), status_codes, max(total, default=0) + 1
     )
 
-    # Filtra colunas válidas: tem data + é dia útil
-    dias_uteis = ~row_dia.str.upper().isin(["SÁB", "SAB", "DOM"])
-    tem_data   = row_data.notna() & (row_data != "Data")
-    colunas_validas = df_raw.columns[dias_uteis & tem_data & (total_por_col > 0)]
-
-    # Normaliza datas
-    datas_raw = row_data[colunas_validas]
-    datas = pd.to_datetime(datas_raw, errors="coerce")
-
-    # ── 2. openpyxl: leitura de cores ────────────────────────────────────────
-    wb = load_workbook(io.BytesIO(file_bytes), data_only=True, read_only=False)
-    ws = wb[sheet_name]
-    last_row = IDX_POS_START + len(posicoes)   # linha Excel (1-based) = pandas idx + 1
-
-    registros = []
-    for pandas_col_idx in colunas_validas:
-        excel_col = pandas_col_idx + 1          # openpyxl é 1-based
-        total = int(total_por_col[pandas_col_idx])
-        if total == 0:
-            continue
-
-        inv, em_and, prob = count_green_cells(
-            ws,
-            col_idx=excel_col,
-            first_row=IDX_POS_START + 1,        # +1 porque openpyxl é 1-based
-            last_row=last_row,
-        )
-        pend = total - inv - em_and - prob
-
-        registros.append({
-            "Data":        datas[pandas_col_idx],
-            "Dia":         str(row_dia[pandas_col_idx]),
-            "Total":       total,
-            "Inventariado": inv,
-            "Em Andamento": em_and,
-            "Problema":    prob,
-            "Pendente":    max(pend, 0),
-        })
-
-    df = pd.DataFrame(registros)
+    # Filtra colunas com data + com posições
+    colunas = [c for c in sorted(total) if c in row_data and row_data[c] != "Data"]
+
+    # Normaliza datas sem inferência de formato: seriais do Excel (unit="D")
+    # e, para células de texto, dd/mm/aaaa
+    datas_raw = pd.Series({c: row_data[c] for c in colunas}, dtype=object)
+    seriais = pd.to_numeric(datas_raw, errors="coerce")
+    datas = pd.to_datetime(seriais, unit="D", origin=origin, errors="coerce")
+    texto = seriais.isna()
+    if texto.any():
+        datas[texto] = pd.to_datetime(datas_raw[texto], format="%d/%m/%Y", errors="coerce")
+
+    # Dia útil pela própria data (seg-sex); sem data legível, vale o rótulo
+    # "Dia da Semana" (SÁB/DOM saem, como antes)
+    rotulo_util = ~pd.Series(
+        [str(row_dia.get(c, "")).upper() for c in datas.index], index=datas.index, dtype=object
+    ).isin(["SÁB", "SAB", "DOM"])
+    datas = datas[(datas.isna() & rotulo_util) | (datas.dt.dayofweek < 5)]
+    colunas_validas = list(datas.index)
+
+    # Monta o DataFrame coluna a coluna (arrays), sem um dict por registro
+    cols   = np.array(colunas_validas, dtype=np.int64)
+    tot    = np.array([total[c] for c in colunas_validas], dtype=np.int64)
+    inv    = counts[cols, STATUS_CODE["INVENTARIADO"]]
+    em_and = counts[cols, STATUS_CODE["EM ANDAMENTO"]]
+    prob   = counts[cols, STATUS_CODE["PROBLEMA"]]
+
+    df = pd.DataFrame({
+        "Data":         datas.to_numpy(),
+        "Dia":          [str(row_dia.get(c, "")) for c in colunas_validas],
+        "Total":        tot,
+        "Inventariado": inv,
+        "Em Andamento": em_and,
+        "Problema":     prob,
+        "Pendente":     np.maximum(tot - inv - em_and - prob, 0),
+    })
     df = df.sort_values("Data").reset_index(drop=True)
     return df
 
@@ -180,11 +366,17 @@ def main():
         value=False,
     )
 
-    file_bytes = uploaded_file.read()
+    file_bytes = uploaded_file.getvalue()
+
+    # Hash calculado uma vez por upload, não a cada rerun
+    if st.session_state.get("upload_id") != uploaded_file.file_id:
+        st.session_state["upload_id"] = uploaded_file.file_id
+        st.session_state["upload_digest"] = hashlib.sha256(file_bytes).hexdigest()
+    file_digest = st.session_state["upload_digest"]
 
     with st.spinner("Processando planilha..."):
         try:
-            df = load_data(file_bytes, sheet_name)
+            df = load_data(file_digest, file_bytes, sheet_name)
         except Exception as e:
             st.error(f"Erro ao processar o arquivo: {e}")
             return
@@ -234,18 +426,23 @@ def main():
 
     # ── Tabela ────────────────────────────────────────────────────────────────
     st.subheader("📋 Detalhamento por Dia")
-    df_disp = df.copy()
-    df_disp["Data"]       = df_disp["Data"].dt.strftime("%d/%m/%Y")
-    df_disp["% Concluído"] = df.apply(
-        lambda x: f"{round(x['Inventariado']/x['Total']*100,1)}%" if x["Total"] > 0 else "0%",
-        axis=1,
-    )
-    df_disp["Meta Ideal"] = df.apply(
-        lambda x: ideal if x["Inventariado"] < x["Total"] else "—", axis=1
-    )
+    pct = (df["Inventariado"] / df["Total"] * 100).round(1)
+    # Frame de exibição montado coluna a coluna, sem copiar o df inteiro
+    df_disp = pd.DataFrame({
+        "Data":         df["Data"].dt.strftime("%d/%m/%Y"),
+        "Dia":          df["Dia"],
+        "Total":        df["Total"],
+        "Inventariado": df["Inventariado"],
+        "Em Andamento": df["Em Andamento"],
+        "Problema":     df["Problema"],
+        "Pendente":     df["Pendente"],
+        "% Concluído":  (pct.astype(str) + "%").where(df["Total"] > 0, "0%"),
+        "Meta Ideal":   pd.Series(ideal, index=df.index, dtype=object).where(
+            df["Inventariado"] < df["Total"], "—"
+        ),
+    })
     st.dataframe(
-        df_disp[["Data","Dia","Total","Inventariado","Em Andamento",
-                 "Problema","Pendente","% Concluído","Meta Ideal"]],
+        df_disp,
         use_container_width=True,
         hide_index=True,
     )